@@ -6,11 +6,14 @@ Main entry point for the sheet music analysis API.
 
 import os
 from contextlib import asynccontextmanager
+from aiofiles.os import path as aio_path
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from app.routers import upload, analysis
+from app.services.executors import shutdown_pools
 
 
 # Ensure uploads directory exists
@@ -26,6 +29,7 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("Music for Dummies API shutting down...")
+    shutdown_pools()
 
 
 app = FastAPI(
@@ -33,6 +37,7 @@ app = FastAPI(
     description="Sheet music analysis and music theory education API",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 # CORS middleware for frontend
@@ -68,5 +73,5 @@ async def health_check():
     return {
         "status": "healthy",
         "upload_dir": UPLOAD_DIR,
-        "upload_dir_exists": os.path.exists(UPLOAD_DIR),
+        "upload_dir_exists": await aio_path.exists(UPLOAD_DIR),
     }
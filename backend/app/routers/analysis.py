@@ -3,102 +3,212 @@ Analysis retrieval and WebSocket endpoints.
 """
 
 import os
-import json
-from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse
+import asyncio
+import itertools
+from typing import Optional
+import aiofiles.os
+import orjson
+from fastapi import APIRouter, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, Response
 
-from app.models import AnalysisResult
 from app.services.music_analyzer import get_analysis_result, analyze_music
+from app.services.upload_registry import upload_exists, analysis_exists, forget
 
 router = APIRouter()
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 
+# Progress messages are coalesced into one frame every 50ms or 8 messages
+WS_FLUSH_INTERVAL = 0.05
+WS_BATCH_SIZE = 8
 
-@router.get("/analysis/{file_id}", response_model=AnalysisResult)
+# Bounded send queue and per-frame send timeout, for backpressure on slow clients
+WS_QUEUE_SIZE = 32
+WS_SEND_TIMEOUT = 5.0
+
+# Compact frame tags. Frames are sent as [tag, seq, payload] arrays, where the
+# payload is a list of progress values, the analysis result, or an error message.
+WS_PROGRESS = 0
+WS_COMPLETE = 1
+WS_ERROR = 2
+
+# Page images never change once rendered for an upload
+PAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/analysis/{file_id}")
 async def get_analysis(file_id: str):
     """
     Get analysis results for a previously uploaded PDF.
+
+    Cached results are served straight from analysis.json so the server
+    can sendfile() them without parsing or revalidation.
     """
     upload_path = os.path.join(UPLOAD_DIR, file_id)
 
-    if not os.path.exists(upload_path):
+    if not await upload_exists(file_id, upload_path):
         raise HTTPException(status_code=404, detail="Analysis not found")
 
     # Check if analysis is complete
     analysis_file = os.path.join(upload_path, "analysis.json")
 
-    if os.path.exists(analysis_file):
-        with open(analysis_file, 'r') as f:
-            return json.load(f)
+    if await analysis_exists(file_id, analysis_file):
+        # Stat once and hand the result to FileResponse. If analysis.json (or
+        # the whole upload) was removed after being registered, forget it and
+        # regenerate below rather than serving a missing file
+        try:
+            stat_result = await aiofiles.os.stat(analysis_file)
+        except FileNotFoundError:
+            forget(file_id)
+            if not await upload_exists(file_id, upload_path):
+                raise HTTPException(status_code=404, detail="Analysis not found")
+        else:
+            return FileResponse(analysis_file, media_type="application/json", stat_result=stat_result)
 
     # If no analysis file exists, generate mock analysis
     result = await get_analysis_result(file_id)
-    return result
+    return Response(content=orjson.dumps(result), media_type="application/json")
 
 
 @router.get("/page/{file_id}/{page_number}")
-async def get_page_image(file_id: str, page_number: int):
+async def get_page_image(request: Request, file_id: str, page_number: int):
     """
     Get the rendered image for a specific page.
+
+    Responds with an ETag derived from the image's mtime and size, and
+    answers matching If-None-Match requests with 304 Not Modified.
     """
     upload_path = os.path.join(UPLOAD_DIR, file_id)
 
-    if not os.path.exists(upload_path):
+    if not await upload_exists(file_id, upload_path):
         raise HTTPException(status_code=404, detail="Upload not found")
 
     image_path = os.path.join(upload_path, f"page_{page_number}.png")
 
-    if not os.path.exists(image_path):
+    # Stat once here and hand the result to FileResponse so it doesn't re-stat
+    try:
+        stat_result = await aiofiles.os.stat(image_path)
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail=f"Page {page_number} not found")
 
-    return FileResponse(image_path, media_type="image/png")
+    etag = f'"{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+    headers = {"ETag": etag, "Cache-Control": PAGE_CACHE_CONTROL}
+
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match and etag in (tag.strip() for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    return FileResponse(image_path, media_type="image/png", headers=headers, stat_result=stat_result)
 
 
 @router.websocket("/ws/analysis/{file_id}")
 async def analysis_websocket(websocket: WebSocket, file_id: str):
     """
     WebSocket endpoint for real-time analysis updates.
+
+    Every frame carries a per-connection sequence number so clients can detect
+    gaps. If the client stops reading, the bounded queue stalls the analysis
+    and the connection is closed with code 1011 once a send times out.
     """
     await websocket.accept()
 
+    seq = itertools.count()
+    close_code = 1000
+
     try:
         upload_path = os.path.join(UPLOAD_DIR, file_id)
 
-        if not os.path.exists(upload_path):
-            await websocket.send_json({
-                "type": "error",
-                "message": "Upload not found"
-            })
-            await websocket.close()
+        if not await upload_exists(file_id, upload_path):
+            await _send(websocket, seq, WS_ERROR, "Upload not found")
             return
 
         # Perform analysis with progress updates
-        async for progress in analyze_music(file_id):
-            if progress["type"] == "progress":
-                await websocket.send_json({
-                    "type": "progress",
-                    "progress": progress["value"]
-                })
-            elif progress["type"] == "complete":
-                await websocket.send_json({
-                    "type": "complete",
-                    "result": progress["result"]
-                })
-                break
-            elif progress["type"] == "error":
-                await websocket.send_json({
-                    "type": "error",
-                    "message": progress["message"]
-                })
-                break
+        queue: asyncio.Queue = asyncio.Queue(maxsize=WS_QUEUE_SIZE)
+        flusher = asyncio.create_task(_flush_progress(websocket, queue, seq))
+
+        try:
+            async for progress in analyze_music(file_id):
+                if progress["type"] == "progress":
+                    await _enqueue_progress(queue, flusher, progress["value"])
+                elif progress["type"] == "complete":
+                    await _drain_progress(queue, flusher)
+                    await _send(websocket, seq, WS_COMPLETE, progress["result"])
+                    break
+                elif progress["type"] == "error":
+                    await _drain_progress(queue, flusher)
+                    await _send(websocket, seq, WS_ERROR, progress["message"])
+                    break
+        finally:
+            flusher.cancel()
 
     except WebSocketDisconnect:
         print(f"WebSocket disconnected for {file_id}")
+    except asyncio.TimeoutError:
+        print(f"WebSocket send timed out for {file_id}")
+        close_code = 1011
     except Exception as e:
-        await websocket.send_json({
-            "type": "error",
-            "message": str(e)
-        })
+        await websocket.send_text(orjson.dumps([WS_ERROR, next(seq), str(e)]).decode())
     finally:
-        await websocket.close()
+        await websocket.close(code=close_code)
+
+
+async def _send(websocket: WebSocket, seq: itertools.count, tag: int, payload):
+    """Send a [tag, seq, payload] frame, bounded by WS_SEND_TIMEOUT."""
+    await asyncio.wait_for(
+        websocket.send_text(orjson.dumps([tag, next(seq), payload]).decode()),
+        timeout=WS_SEND_TIMEOUT,
+    )
+
+
+async def _enqueue_progress(queue: asyncio.Queue, flusher: asyncio.Task, value: Optional[float]):
+    """
+    Queue a progress value, waiting while the queue is full.
+
+    Re-raises the flusher's error if it has already failed.
+    """
+    if flusher.done():
+        flusher.result()
+    await asyncio.wait_for(queue.put(value), timeout=WS_SEND_TIMEOUT)
+
+
+async def _flush_progress(websocket: WebSocket, queue: asyncio.Queue, seq: itertools.count):
+    """
+    Send queued progress values as batched frames.
+
+    A batch is flushed once it holds WS_BATCH_SIZE values or WS_FLUSH_INTERVAL
+    has passed since its first value. A None sentinel flushes and stops.
+    """
+    loop = asyncio.get_running_loop()
+
+    while True:
+        value = await queue.get()
+        if value is None:
+            return
+
+        batch = [value]
+        deadline = loop.time() + WS_FLUSH_INTERVAL
+        done = False
+
+        while len(batch) < WS_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                value = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            if value is None:
+                done = True
+                break
+            batch.append(value)
+
+        await _send(websocket, seq, WS_PROGRESS, batch)
+
+        if done:
+            return
+
+
+async def _drain_progress(queue: asyncio.Queue, flusher: asyncio.Task):
+    """Flush any pending progress values before a terminal frame."""
+    await _enqueue_progress(queue, flusher, None)
+    await flusher
@@ -4,16 +4,22 @@ PDF upload endpoint.
 
 import os
 import uuid
+import shutil
 import aiofiles
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
 from app.models import UploadResponse
 from app.services.pdf_processor import process_pdf
+from app.services.upload_registry import mark_upload
 
 router = APIRouter()
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50MB
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
+PDF_MAGIC = b'%PDF-'
+
 
 @router.post("/upload", response_model=UploadResponse)
 async def upload_pdf(file: UploadFile = File(...)):
@@ -26,10 +32,10 @@ async def upload_pdf(file: UploadFile = File(...)):
     if not file.filename or not file.filename.lower().endswith('.pdf'):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
 
-    # Validate file size (max 50MB)
-    content = await file.read()
-    if len(content) > 50 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
+    # Validate PDF magic bytes before anything touches disk
+    header = await file.read(len(PDF_MAGIC))
+    if not header.startswith(PDF_MAGIC):
+        raise HTTPException(status_code=400, detail="File is not a valid PDF")
 
     # Generate unique ID
     file_id = str(uuid.uuid4())
@@ -38,10 +44,20 @@ async def upload_pdf(file: UploadFile = File(...)):
     upload_path = os.path.join(UPLOAD_DIR, file_id)
     os.makedirs(upload_path, exist_ok=True)
 
-    # Save the PDF
+    # Stream the PDF to disk, enforcing the size limit (max 50MB) as we go
     pdf_path = os.path.join(upload_path, "original.pdf")
+    total = len(header)
     async with aiofiles.open(pdf_path, 'wb') as f:
-        await f.write(content)
+        await f.write(header)
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            total += len(chunk)
+            if total > MAX_UPLOAD_SIZE:
+                break
+            await f.write(chunk)
+
+    if total > MAX_UPLOAD_SIZE:
+        shutil.rmtree(upload_path, ignore_errors=True)
+        raise HTTPException(status_code=400, detail="File size exceeds 50MB limit")
 
     # Start PDF processing (converts pages to images)
     try:
@@ -49,6 +65,8 @@ async def upload_pdf(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to process PDF: {str(e)}")
 
+    mark_upload(file_id)
+
     return UploadResponse(
         id=file_id,
         filename=file.filename,
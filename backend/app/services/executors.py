@@ -0,0 +1,130 @@
+"""
+Shared executors for blocking work.
+
+CPU-bound analysis work (oemer inference, music21 parsing) runs in a process
+pool so pages can be processed on several cores instead of contending for
+the GIL. PDF pages are rendered in a pool of their own, so uploads never
+wait behind a long OMR run. Blocking file I/O runs in a thread pool.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Optional
+
+CPU_POOL_SIZE = os.cpu_count() or 1
+RENDER_POOL_SIZE = os.cpu_count() or 1
+IO_POOL_SIZE = 16
+
+_CPU_POOL: Optional[ProcessPoolExecutor] = None
+_RENDER_POOL: Optional[ProcessPoolExecutor] = None
+_IO_POOL: Optional[ThreadPoolExecutor] = None
+
+# One slot per CPU pool worker, per event loop
+_CPU_SLOTS: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+
+def _spawn_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Create a process pool.
+
+    Workers are spawned rather than forked, since forking a process that
+    already runs threads (or has ONNX Runtime loaded) is unsafe.
+    """
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+
+
+def get_cpu_pool() -> ProcessPoolExecutor:
+    """Get the shared process pool for analysis work, creating it on first use."""
+    global _CPU_POOL
+    if _CPU_POOL is None:
+        _CPU_POOL = _spawn_pool(CPU_POOL_SIZE)
+    return _CPU_POOL
+
+
+def get_render_pool() -> ProcessPoolExecutor:
+    """Get the process pool for rendering PDF pages, creating it on first use."""
+    global _RENDER_POOL
+    if _RENDER_POOL is None:
+        _RENDER_POOL = _spawn_pool(RENDER_POOL_SIZE)
+    return _RENDER_POOL
+
+
+async def run_in_cpu_pool(func: Callable, *args):
+    """
+    Run func(*args) in the shared CPU process pool.
+
+    At most CPU_POOL_SIZE calls are submitted at once, so a submitted call
+    starts on a free worker right away and callers wait here rather than in
+    the pool's queue. A task in a worker process can't be cancelled, so any
+    time limit has to be enforced by func itself.
+    """
+    async with _cpu_slots():
+        return await _run_in_pool(get_cpu_pool, func, *args)
+
+
+async def run_in_render_pool(func: Callable, *args):
+    """Run func(*args) in the PDF rendering process pool."""
+    return await _run_in_pool(get_render_pool, func, *args)
+
+
+def _cpu_slots() -> asyncio.Semaphore:
+    """Get the semaphore limiting in-flight CPU pool calls for the running loop."""
+    loop = asyncio.get_running_loop()
+    slots = _CPU_SLOTS.get(loop)
+    if slots is None:
+        slots = _CPU_SLOTS[loop] = asyncio.Semaphore(CPU_POOL_SIZE)
+    return slots
+
+
+async def _run_in_pool(get_pool: Callable[[], ProcessPoolExecutor], func: Callable, *args):
+    """
+    Run func(*args) in a process pool.
+
+    If a worker dies (e.g. killed for running out of memory), the pool
+    breaks and fails every call it was running. Those calls are retried
+    once in a fresh pool.
+    """
+    loop = asyncio.get_running_loop()
+
+    for attempt in range(2):
+        pool = get_pool()
+        try:
+            return await loop.run_in_executor(pool, func, *args)
+        except BrokenProcessPool:
+            _discard_pool(pool)
+            if attempt:
+                raise
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """Stop handing out a broken pool, so the next call creates a fresh one."""
+    global _CPU_POOL, _RENDER_POOL
+    if _CPU_POOL is pool:
+        _CPU_POOL = None
+    if _RENDER_POOL is pool:
+        _RENDER_POOL = None
+    pool.shutdown(wait=False)
+
+
+def get_io_pool() -> ThreadPoolExecutor:
+    """Get the shared thread pool for blocking I/O, creating it on first use."""
+    global _IO_POOL
+    if _IO_POOL is None:
+        _IO_POOL = ThreadPoolExecutor(max_workers=IO_POOL_SIZE, thread_name_prefix="io")
+    return _IO_POOL
+
+
+def shutdown_pools():
+    """Shut down the shared pools, e.g. on application shutdown."""
+    global _CPU_POOL, _RENDER_POOL, _IO_POOL
+    for pool in (_CPU_POOL, _RENDER_POOL, _IO_POOL):
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+    _CPU_POOL = _RENDER_POOL = _IO_POOL = None
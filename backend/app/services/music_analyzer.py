@@ -7,26 +7,38 @@ Integrates with OMR service for real sheet music recognition.
 """
 
 import os
-import json
-import uuid
 import asyncio
-from typing import AsyncGenerator
+import re
+import sys
+import uuid
+import hashlib
+import functools
+import importlib.util
+from dataclasses import dataclass
+from typing import AsyncGenerator, Optional
+
+import aiofiles
+import aiofiles.os
+import numpy as np
+import orjson
 
-# Try to import music21
-try:
-    from music21 import chord, key, roman, pitch, scale
-    HAS_MUSIC21 = True
-except ImportError:
-    HAS_MUSIC21 = False
+from app.models import AnalysisResult
 
 # Import OMR service
 from app.services.omr_service import full_analysis, process_page_with_omr, detect_measure_positions
+from app.services.upload_registry import analysis_exists, forget, mark_analysis
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 
 # Flag to enable/disable real OMR (can be toggled for testing)
 USE_REAL_OMR = True
 
+# While OMR runs, progress advances by OMR_PROGRESS_STEP every
+# OMR_PROGRESS_INTERVAL seconds, up to OMR_PROGRESS_CAP
+OMR_PROGRESS_INTERVAL = 2.0
+OMR_PROGRESS_STEP = 0.05
+OMR_PROGRESS_CAP = 0.6
+
 # Chord function mappings
 CHORD_FUNCTIONS = {
     'I': 'tonic',
@@ -45,31 +57,100 @@ CHORD_FUNCTIONS = {
     'vii': 'dominant',
 }
 
+# Note names in chromatic order, and Roman numerals for each chromatic degree
+NOTE_NAMES = ('C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B')
+ROMAN_NUMERALS = ('I', 'bII', 'II', 'bIII', 'III', 'IV', '#IV', 'V', 'bVI', 'VI', 'bVII', 'VII')
+
+# Pitch class index for every sharp and flat spelling
+PC_INDEX = {name: i for i, name in enumerate(NOTE_NAMES)}
+PC_INDEX.update({'Db': 1, 'Eb': 3, 'Gb': 6, 'Ab': 8, 'Bb': 10})
+
+# Common opening progressions (lowercased Roman numerals) and their names
+PROGRESSION_NAMES = {
+    ('i', 'v', 'vi', 'iv'): 'Pop progression',
+    ('i', 'iv', 'v', 'i'): 'Classical cadence',
+    ('ii', 'v', 'i'): 'Jazz ii-V-I',
+    ('i', 'vi', 'iv', 'v'): '50s progression',
+    ('vi', 'iv', 'i', 'v'): 'Axis progression',
+}
+
+# Seventh and inversion figures after a Roman numeral (7, maj7, 65, 6/4, ...),
+# stripped before matching PROGRESSION_NAMES
+_FIGURE_RE = re.compile(r'maj|\d+(?:/\d+)*')
+
+# Semitone intervals above the root for each triad quality
+TRIAD_INTERVALS = {
+    'major': (0, 4, 7),
+    'minor': (0, 3, 7),
+    'diminished': (0, 3, 6),
+    'augmented': (0, 4, 8),
+}
+
+# Quality markers in a chord suffix, found in one pass. Words (maj7, maj,
+# dim, aug) match in any case and are listed first so they are matched
+# whole; a bare "M" means major and a bare "m" minor, so those stay
+# case-sensitive.
+_QUALITY_RE = re.compile(r'(?i:maj7|maj|dim|aug)|M7|M|m|°|\+|7')
+
+# Uppercase major markers, spelled as their word equivalents
+_MAJOR_MARKERS = {'M7': 'maj7', 'M': 'maj'}
+
+# Single-character extensions and accidentals stripped before function lookup
+_STRIP_CHARS = str.maketrans('', '', '7#b+°')
+
+
+# music21 takes seconds to import, so only check that it is installed here.
+# The chord, key and roman modules are imported on first use, and workers
+# that never analyze chords (uploads, page images) don't pay for them.
+HAS_MUSIC21 = importlib.util.find_spec("music21") is not None
+
 
 def get_chord_function(roman_numeral: str) -> str:
     """Determine harmonic function from Roman numeral."""
-    # Strip any extensions (7, maj7, etc.) and accidentals
-    base = roman_numeral.replace('7', '').replace('maj', '').replace('dim', '').replace('aug', '')
-    base = base.replace('#', '').replace('b', '').replace('+', '').replace('°', '')
+    function = _CHORD_FUNCTION_FULL.get(roman_numeral)
+    if function is not None:
+        return function
+    return _strip_chord_function(roman_numeral)
+
 
-    if base in CHORD_FUNCTIONS:
-        return CHORD_FUNCTIONS[base]
+def _strip_chord_function(roman_numeral: str) -> str:
+    """Determine harmonic function by stripping a Roman numeral to its base."""
+    # Strip any extensions (7, maj7, etc.) and accidentals
+    base = roman_numeral.translate(_STRIP_CHARS).replace('maj', '').replace('dim', '').replace('aug', '')
+    function = CHORD_FUNCTIONS.get(base)
+    if function is not None:
+        return function
 
     # Check for secondary dominants
     if '/' in roman_numeral:
         return 'secondary_dominant'
 
     # Borrowed chords (e.g., bVII, bIII)
-    if roman_numeral.startswith('b') or roman_numeral.startswith('#'):
+    if roman_numeral[:1] in ('b', '#'):
         return 'borrowed'
 
     return 'unknown'
 
 
+# Every common decorated form of each numeral, resolved once at import so
+# get_chord_function is a single lookup for everything it usually sees
+_CHORD_FUNCTION_FULL = {
+    form: _strip_chord_function(form)
+    for form in (
+        prefix + base + suffix
+        for base in CHORD_FUNCTIONS
+        for prefix in ('', 'b', '#')
+        for suffix in ('', '7', 'maj7', 'dim', 'dim7', '°', '°7', '+')
+    )
+}
+
+
 def analyze_chord_symbol(symbol: str, current_key: str = 'C') -> dict:
     """
     Analyze a chord symbol and return detailed information.
 
+    Results are memoized per (symbol, current_key); each call gets a fresh dict.
+
     Args:
         symbol: Chord symbol (e.g., "Cmaj7", "Am", "D7/F#")
         current_key: Current key context
@@ -77,18 +158,48 @@ def analyze_chord_symbol(symbol: str, current_key: str = 'C') -> dict:
     Returns:
         dict with chord analysis
     """
+    return {
+        k: list(v) if isinstance(v, tuple) else v
+        for k, v in _analyze_chord_symbol_cached(symbol, current_key)
+    }
+
+
+@functools.lru_cache(maxsize=4096)
+def _analyze_chord_symbol_cached(symbol: str, current_key: str) -> tuple:
+    """Analyze a chord symbol, frozen into (key, value) pairs with tuple lists."""
     if HAS_MUSIC21:
-        return _analyze_with_music21(symbol, current_key)
+        result = _analyze_with_music21(symbol, current_key)
     else:
-        return _analyze_basic(symbol, current_key)
+        result = _analyze_basic(symbol, current_key)
+
+    return tuple(
+        (k, tuple(v) if isinstance(v, list) else v)
+        for k, v in result.items()
+    )
+
+
+@functools.lru_cache(maxsize=32)
+def _get_music21_key(tonic: str):
+    """Build a music21 Key, cached since a piece rarely uses more than a few."""
+    from music21 import key
+    return key.Key(tonic)
+
+
+@functools.lru_cache(maxsize=2048)
+def _get_music21_chord(symbol: str):
+    """Build a music21 Chord, cached per symbol. Callers only read from it."""
+    from music21 import chord
+    return chord.Chord(symbol)
 
 
 def _analyze_with_music21(symbol: str, current_key: str) -> dict:
     """Use music21 for chord analysis."""
+    from music21 import roman
+
     try:
         # Parse the chord
-        c = chord.Chord(symbol)
-        k = key.Key(current_key)
+        c = _get_music21_chord(symbol)
+        k = _get_music21_key(current_key)
 
         # Get Roman numeral
         rn = roman.romanNumeralFromChord(c, k)
@@ -123,16 +234,11 @@ def _analyze_basic(symbol: str, current_key: str) -> dict:
         bass = parts[1]
 
     # Determine quality
-    quality = 'major'
-    if 'm' in quality_part.lower() and 'maj' not in quality_part.lower():
-        quality = 'minor'
-    elif 'dim' in quality_part.lower() or '°' in quality_part:
-        quality = 'diminished'
-    elif 'aug' in quality_part.lower() or '+' in quality_part:
-        quality = 'augmented'
+    tokens = _quality_tokens(quality_part)
+    quality = _triad_quality(tokens)
 
     # Calculate notes based on root and quality
-    notes = _get_chord_notes(root, quality_part)
+    notes = _get_chord_notes(root, quality_part, tokens)
 
     # Calculate Roman numeral
     roman_numeral = _get_roman_numeral(root, quality, current_key)
@@ -142,72 +248,61 @@ def _analyze_basic(symbol: str, current_key: str) -> dict:
         "root": root,
         "quality": quality_part if quality_part else 'maj',
         "bass": bass,
-        "notes": notes,
+        "notes": list(notes),
         "romanNumeral": roman_numeral,
         "function": get_chord_function(roman_numeral),
     }
 
 
-def _get_chord_notes(root: str, quality: str) -> list:
-    """Get notes in a chord based on root and quality."""
-    # Simplified note calculation
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+def _quality_tokens(quality: str) -> frozenset:
+    """Collect the quality markers (maj7, m, dim, 7, ...) in a chord suffix."""
+    return frozenset(_MAJOR_MARKERS.get(token, token.lower()) for token in _QUALITY_RE.findall(quality))
 
-    # Handle flats
-    flat_to_sharp = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
-    if root in flat_to_sharp:
-        root = flat_to_sharp[root]
 
-    if root not in note_names:
-        root = root[0]  # Fallback to just the letter
+def _triad_quality(tokens: frozenset) -> str:
+    """Classify the triad from a chord suffix's quality markers."""
+    if 'dim' in tokens or '°' in tokens:
+        return 'diminished'
+    # A bare "m" is minor, even next to a major seventh as in CmM7 or Cmmaj7
+    if 'm' in tokens:
+        return 'minor'
+    if 'aug' in tokens or '+' in tokens:
+        return 'augmented'
+    return 'major'
 
-    root_idx = note_names.index(root) if root in note_names else 0
+
+@functools.lru_cache(maxsize=1024)
+def _get_chord_notes(root: str, quality: str, tokens: Optional[frozenset] = None) -> tuple:
+    """Get notes in a chord based on root and quality."""
+    if tokens is None:
+        tokens = _quality_tokens(quality)
+
+    # Simplified note calculation, falling back to just the letter
+    root_idx = PC_INDEX.get(root, PC_INDEX.get(root[0], 0))
 
     # Intervals based on quality
-    if 'm' in quality and 'maj' not in quality:
-        intervals = [0, 3, 7]  # Minor
-    elif 'dim' in quality or '°' in quality:
-        intervals = [0, 3, 6]  # Diminished
-    elif 'aug' in quality or '+' in quality:
-        intervals = [0, 4, 8]  # Augmented
-    else:
-        intervals = [0, 4, 7]  # Major
+    intervals = TRIAD_INTERVALS[_triad_quality(tokens)]
 
     # Add 7th if present
-    if '7' in quality:
-        if 'maj7' in quality.lower():
-            intervals.append(11)  # Major 7th
-        else:
-            intervals.append(10)  # Minor 7th
+    if 'maj7' in tokens:
+        intervals += (11,)
+    elif '7' in tokens:
+        intervals += (10,)
 
-    notes = []
-    for interval in intervals:
-        note_idx = (root_idx + interval) % 12
-        notes.append(note_names[note_idx])
-
-    return notes
+    return tuple(NOTE_NAMES[(root_idx + interval) % 12] for interval in intervals)
 
 
+@functools.lru_cache(maxsize=1024)
 def _get_roman_numeral(root: str, quality: str, key_tonic: str) -> str:
     """Calculate Roman numeral relative to key."""
-    note_names = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
-    roman_numerals = ['I', 'bII', 'II', 'bIII', 'III', 'IV', '#IV', 'V', 'bVI', 'VI', 'bVII', 'VII']
-
-    # Normalize flats
-    flat_to_sharp = {'Db': 'C#', 'Eb': 'D#', 'Gb': 'F#', 'Ab': 'G#', 'Bb': 'A#'}
-    if root in flat_to_sharp:
-        root = flat_to_sharp[root]
-    if key_tonic in flat_to_sharp:
-        key_tonic = flat_to_sharp[key_tonic]
-
-    root_idx = note_names.index(root) if root in note_names else 0
-    key_idx = note_names.index(key_tonic) if key_tonic in note_names else 0
+    root_idx = PC_INDEX.get(root, 0)
+    key_idx = PC_INDEX.get(key_tonic, 0)
 
     degree = (root_idx - key_idx) % 12
-    numeral = roman_numerals[degree]
+    numeral = ROMAN_NUMERALS[degree]
 
-    # Lowercase for minor chords
-    if quality == 'minor' or quality == 'm':
+    # Lowercase for minor and diminished chords
+    if quality in ('minor', 'm', 'diminished'):
         numeral = numeral.lower()
 
     return numeral
@@ -222,9 +317,13 @@ async def get_analysis_result(file_id: str) -> dict:
     analysis_path = os.path.join(upload_path, "analysis.json")
 
     # Check for cached analysis
-    if os.path.exists(analysis_path):
-        with open(analysis_path, 'r') as f:
-            return json.load(f)
+    if await analysis_exists(file_id, analysis_path):
+        try:
+            async with aiofiles.open(analysis_path, 'rb') as f:
+                return orjson.loads(await f.read())
+        except FileNotFoundError:
+            # Removed since it was registered, so regenerate it
+            forget(file_id)
 
     # Count available pages
     num_pages = count_page_images(upload_path)
@@ -242,17 +341,152 @@ async def get_analysis_result(file_id: str) -> dict:
         result = generate_mock_analysis(file_id)
 
     # Cache the result
-    with open(analysis_path, 'w') as f:
-        json.dump(result, f)
+    await save_analysis(file_id, analysis_path, result)
+
+    return result
+
+
+async def save_analysis(file_id: str, analysis_path: str, result: dict) -> None:
+    """
+    Write analysis.json off the event loop.
+
+    The file is written under a temporary name and renamed into place, so
+    concurrent readers never see a partial analysis.json. Each save gets
+    its own temporary file, since two saves of the same analysis can run
+    at once.
+    """
+    tmp_path = f"{analysis_path}.{uuid.uuid4().hex}.tmp"
+    try:
+        async with aiofiles.open(tmp_path, 'wb') as f:
+            await f.write(orjson.dumps(result))
+        await aiofiles.os.replace(tmp_path, analysis_path)
+    except BaseException:
+        # Don't leave a partial temporary file behind on failure or cancellation
+        try:
+            await aiofiles.os.remove(tmp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+    # Only a complete file may be marked as known
+    mark_analysis(file_id)
 
+
+def validate_analysis(result: dict) -> dict:
+    """
+    Validate an analysis result against the AnalysisResult schema.
+
+    Runs once when a result is produced, so cached analysis.json files are
+    known to be valid and can be served without revalidation.
+    """
+    AnalysisResult.model_validate(result, from_attributes=True)
     return result
 
 
 def count_page_images(upload_path: str) -> int:
     """Count the number of page images in the upload directory."""
-    if not os.path.exists(upload_path):
+    try:
+        with os.scandir(upload_path) as entries:
+            return sum(
+                1 for e in entries
+                if e.name.startswith('page_') and e.name.endswith('.png') and e.is_file()
+            )
+    except FileNotFoundError:
         return 0
-    return len([f for f in os.listdir(upload_path) if f.startswith('page_') and f.endswith('.png')])
+
+
+@dataclass(slots=True)
+class FormattedChord:
+    """
+    A chord in a formatted analysis result.
+
+    Slotted to keep large results small in memory; orjson serializes it with
+    the same keys, in the same order, as the ChordAnalysis schema.
+    """
+    id: str
+    symbol: str
+    root: str
+    quality: str
+    notes: list
+    boundingBox: dict
+    romanNumeral: str
+    function: str
+    confidence: float
+    beatPosition: int
+
+
+BOX_KEYS = ("x", "y", "width", "height")
+
+# Chord label boxes are inset within their measure; note heads are a fixed
+# size, offset from the measure's corner
+_CHORD_INSET = np.array([0.02, 0.02, -0.04, -0.04])
+_NOTE_OFFSET = np.array([0.02, 0.04])
+_NOTE_SIZE = np.array([0.03, 0.08])
+
+
+def _grid_boxes(indices: np.ndarray) -> np.ndarray:
+    """Grid positions, as (N, 4) rows, for measures of a page when none were detected."""
+    return np.column_stack([
+        0.05 + (indices % 4) * 0.23,
+        0.15 + (indices // 4) * 0.2,
+        np.full(len(indices), 0.2),
+        np.full(len(indices), 0.15),
+    ])
+
+
+def _layout_boxes(measure_boxes: np.ndarray) -> tuple:
+    """Chord and note boxes for an (N, 4) array of measure boxes, as lists of dicts."""
+    chord_boxes = measure_boxes + _CHORD_INSET
+    note_boxes = np.column_stack([
+        measure_boxes[:, :2] + _NOTE_OFFSET,
+        np.broadcast_to(_NOTE_SIZE, (len(measure_boxes), 2)),
+    ])
+    return _box_dicts(chord_boxes), _box_dicts(note_boxes)
+
+
+def _box_dicts(boxes: np.ndarray) -> list:
+    """Convert (N, 4) box rows to boundingBox dicts."""
+    return [dict(zip(BOX_KEYS, row)) for row in boxes.tolist()]
+
+
+def _page_boxes(measures: list) -> list:
+    """
+    Measure, chord and note boxes for every measure on a page.
+
+    Detected boxes and grid positions past the precomputed table are each
+    laid out in one vectorized pass.
+    """
+    boxes = [None] * len(measures)
+
+    detected = []
+    missing = []
+    for i, measure in enumerate(measures):
+        if "boundingBox" in measure:
+            detected.append(i)
+        elif i < len(_MEASURE_BBOX):
+            boxes[i] = (_MEASURE_BBOX[i], _CHORD_BBOX[i], _NOTE_BBOX[i])
+        else:
+            missing.append(i)
+
+    if detected:
+        measure_bboxes = [measures[i]["boundingBox"] for i in detected]
+        rows = np.array([[bbox[key] for key in BOX_KEYS] for bbox in measure_bboxes], dtype=float)
+        for i, bbox, chord_bbox, note_bbox in zip(detected, measure_bboxes, *_layout_boxes(rows)):
+            boxes[i] = (bbox, chord_bbox, note_bbox)
+
+    if missing:
+        rows = _grid_boxes(np.array(missing))
+        for i, bbox, chord_bbox, note_bbox in zip(missing, _box_dicts(rows), *_layout_boxes(rows)):
+            boxes[i] = (bbox, chord_bbox, note_bbox)
+
+    return boxes
+
+
+# Default layout for the first 64 measures of a page. These dicts are shared
+# across results and are only ever serialized, never mutated.
+_GRID_BOXES = _grid_boxes(np.arange(64))
+_MEASURE_BBOX = tuple(_box_dicts(_GRID_BOXES))
+_CHORD_BBOX, _NOTE_BBOX = map(tuple, _layout_boxes(_GRID_BOXES))
 
 
 def format_analysis_result(file_id: str, omr_result: dict) -> dict:
@@ -261,41 +495,38 @@ def format_analysis_result(file_id: str, omr_result: dict) -> dict:
     Adds IDs and bounding boxes where needed.
     """
     pages = []
+    all_roman_numerals = []
 
     for page_data in omr_result.get("pages", []):
         measures = []
 
-        for i, measure in enumerate(page_data.get("measures", [])):
-            # Ensure bounding box exists
-            bbox = measure.get("boundingBox", {
-                "x": 0.05 + (i % 4) * 0.23,
-                "y": 0.15 + (i // 4) * 0.2,
-                "width": 0.2,
-                "height": 0.15
-            })
+        # Ensure bounding boxes exist, using the grid where none was detected
+        page_measures = page_data.get("measures", [])
+        page_boxes = _page_boxes(page_measures)
+
+        for i, measure in enumerate(page_measures):
+            bbox, chord_bbox, note_bbox = page_boxes[i]
 
             # Format chords
             formatted_chords = []
             for j, chord_data in enumerate(measure.get("chords", [])):
-                chord_bbox = {
-                    "x": bbox["x"] + 0.02,
-                    "y": bbox["y"] + 0.02,
-                    "width": bbox["width"] - 0.04,
-                    "height": bbox["height"] - 0.04
-                }
-
-                formatted_chords.append({
-                    "id": f"chord-{page_data.get('pageNumber', 1)}-{i}-{j}",
-                    "symbol": chord_data.get("symbol", "?"),
-                    "root": chord_data.get("root", "?"),
-                    "quality": chord_data.get("quality", ""),
-                    "notes": chord_data.get("notes", []),
-                    "boundingBox": chord_bbox,
-                    "romanNumeral": chord_data.get("romanNumeral", "?"),
-                    "function": chord_data.get("function", "unknown"),
-                    "confidence": chord_data.get("confidence", 0.8),
-                    "beatPosition": 1
-                })
+                # Interned, so the handful of distinct numerals in a piece are
+                # shared by every chord and the progression list
+                roman_numeral = sys.intern(chord_data.get("romanNumeral", "?"))
+                all_roman_numerals.append(roman_numeral)
+
+                formatted_chords.append(FormattedChord(
+                    id=f"chord-{page_data.get('pageNumber', 1)}-{i}-{j}",
+                    symbol=chord_data.get("symbol", "?"),
+                    root=chord_data.get("root", "?"),
+                    quality=chord_data.get("quality", ""),
+                    notes=chord_data.get("notes", []),
+                    boundingBox=chord_bbox,
+                    romanNumeral=roman_numeral,
+                    function=chord_data.get("function", "unknown"),
+                    confidence=chord_data.get("confidence", 0.8),
+                    beatPosition=1,
+                ))
 
             # Format notes into beats
             beats = [{
@@ -304,12 +535,7 @@ def format_analysis_result(file_id: str, omr_result: dict) -> dict:
                     {
                         "pitch": n.get("pitch", "C4"),
                         "duration": n.get("duration", "quarter"),
-                        "boundingBox": {
-                            "x": bbox["x"] + 0.02,
-                            "y": bbox["y"] + 0.04,
-                            "width": 0.03,
-                            "height": 0.08
-                        }
+                        "boundingBox": note_bbox,
                     }
                     for n in measure.get("notes", [])[:4]  # Limit notes shown
                 ],
@@ -330,14 +556,7 @@ def format_analysis_result(file_id: str, omr_result: dict) -> dict:
             "measures": measures
         })
 
-    # Build chord progression from all measures
-    all_roman_numerals = []
-    for page in pages:
-        for measure in page.get("measures", []):
-            for chord_data in measure.get("chords", []):
-                all_roman_numerals.append(chord_data.get("romanNumeral", "?"))
-
-    return {
+    return validate_analysis({
         "id": file_id,
         "filename": "sheet_music.pdf",
         "pages": pages,
@@ -348,7 +567,7 @@ def format_analysis_result(file_id: str, omr_result: dict) -> dict:
             "commonName": identify_progression(all_roman_numerals)
         },
         "status": "completed"
-    }
+    })
 
 
 def identify_progression(roman_numerals: list) -> str:
@@ -356,22 +575,10 @@ def identify_progression(roman_numerals: list) -> str:
     if not roman_numerals:
         return None
 
-    # Check for common patterns
-    pattern = " ".join(roman_numerals[:4]).lower()
-
-    common_patterns = {
-        "i v vi iv": "Pop progression",
-        "i iv v i": "Classical cadence",
-        "ii v i": "Jazz ii-V-I",
-        "i vi iv v": "50s progression",
-        "vi iv i v": "Axis progression",
-    }
-
-    for p, name in common_patterns.items():
-        if pattern.startswith(p):
-            return name
-
-    return None
+    # Check for common patterns on the opening four chords, then three,
+    # ignoring sevenths and inversions
+    opening = tuple(_FIGURE_RE.sub('', rn).lower() for rn in roman_numerals[:4])
+    return PROGRESSION_NAMES.get(opening) or PROGRESSION_NAMES.get(opening[:3])
 
 
 async def analyze_music(file_id: str) -> AsyncGenerator[dict, None]:
@@ -390,9 +597,20 @@ async def analyze_music(file_id: str) -> AsyncGenerator[dict, None]:
 
         yield {"type": "progress", "value": 0.2, "message": "Running OMR (this may take a minute)..."}
 
+        # Run OMR in the background, reporting progress while it runs so the
+        # client sees movement and the connection stays alive
+        task = asyncio.create_task(full_analysis(file_id, num_pages))
+        progress = 0.2
+
         try:
-            # Run OMR analysis
-            omr_result = await full_analysis(file_id, num_pages)
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=OMR_PROGRESS_INTERVAL)
+                if done:
+                    break
+                progress = min(OMR_PROGRESS_CAP, progress + OMR_PROGRESS_STEP)
+                yield {"type": "progress", "value": progress, "message": "Running OMR..."}
+
+            omr_result = task.result()
 
             yield {"type": "progress", "value": 0.7, "message": "Analyzing harmony..."}
 
@@ -404,6 +622,9 @@ async def analyze_music(file_id: str) -> AsyncGenerator[dict, None]:
             print(f"OMR failed: {e}")
             yield {"type": "progress", "value": 0.5, "message": "OMR failed, using fallback..."}
             result = generate_mock_analysis(file_id)
+        finally:
+            # The consumer may stop iterating (e.g. the client disconnected)
+            task.cancel()
     else:
         # Simulated analysis for demo
         steps = [
@@ -417,121 +638,162 @@ async def analyze_music(file_id: str) -> AsyncGenerator[dict, None]:
 
         for progress, message in steps:
             yield {"type": "progress", "value": progress, "message": message}
-            await asyncio.sleep(0.3)
 
         result = generate_mock_analysis(file_id)
 
     # Save analysis
     analysis_path = os.path.join(upload_path, "analysis.json")
-    with open(analysis_path, 'w') as f:
-        json.dump(result, f)
+    await save_analysis(file_id, analysis_path, result)
 
     yield {"type": "progress", "value": 1.0, "message": "Complete"}
     yield {"type": "complete", "result": result}
 
 
-def generate_mock_analysis(file_id: str) -> dict:
-    """
-    Generate mock analysis data with realistic chord progressions.
-
-    This simulates what real OMR + analysis would produce.
-    """
-    global_key = {"tonic": "C", "mode": "major", "signature": 0}
-
-    # Common chord progressions
-    progressions = [
-        # I - V - vi - IV (Pop progression)
-        [
-            {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
-            {"symbol": "G", "root": "G", "quality": "maj", "notes": ["G", "B", "D"], "roman": "V", "func": "dominant"},
-            {"symbol": "Am", "root": "A", "quality": "m", "notes": ["A", "C", "E"], "roman": "vi", "func": "tonic"},
-            {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
-        ],
-        # I - IV - V - I (Classic)
-        [
-            {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
-            {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
-            {"symbol": "G7", "root": "G", "quality": "7", "notes": ["G", "B", "D", "F"], "roman": "V7", "func": "dominant"},
-            {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
-        ],
-        # ii - V - I (Jazz)
-        [
-            {"symbol": "Dm7", "root": "D", "quality": "m7", "notes": ["D", "F", "A", "C"], "roman": "ii7", "func": "predominant"},
-            {"symbol": "G7", "root": "G", "quality": "7", "notes": ["G", "B", "D", "F"], "roman": "V7", "func": "dominant"},
-            {"symbol": "Cmaj7", "root": "C", "quality": "maj7", "notes": ["C", "E", "G", "B"], "roman": "Imaj7", "func": "tonic"},
-            {"symbol": "Am7", "root": "A", "quality": "m7", "notes": ["A", "C", "E", "G"], "roman": "vi7", "func": "tonic"},
-        ],
-        # I - vi - IV - V (50s progression)
-        [
-            {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
-            {"symbol": "Am", "root": "A", "quality": "m", "notes": ["A", "C", "E"], "roman": "vi", "func": "tonic"},
-            {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
-            {"symbol": "G", "root": "G", "quality": "maj", "notes": ["G", "B", "D"], "roman": "V", "func": "dominant"},
-        ],
-    ]
-
-    measures = []
-    num_measures = 16
-
-    import random
-    random.seed(hash(file_id))  # Consistent results for same file
-
-    for i in range(num_measures):
-        prog = progressions[i // 4 % len(progressions)]
-        chord_data = prog[i % 4]
-
-        measure_x = (i % 4) * 0.22 + 0.06
-        measure_y = (i // 4) * 0.18 + 0.15
-
-        confidence = 0.85 + random.random() * 0.15
-
-        chord = {
-            "id": f"chord-{i}",
+# Common chord progressions used by the mock analysis
+MOCK_PROGRESSIONS = [
+    # I - V - vi - IV (Pop progression)
+    [
+        {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
+        {"symbol": "G", "root": "G", "quality": "maj", "notes": ["G", "B", "D"], "roman": "V", "func": "dominant"},
+        {"symbol": "Am", "root": "A", "quality": "m", "notes": ["A", "C", "E"], "roman": "vi", "func": "tonic"},
+        {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
+    ],
+    # I - IV - V - I (Classic)
+    [
+        {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
+        {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
+        {"symbol": "G7", "root": "G", "quality": "7", "notes": ["G", "B", "D", "F"], "roman": "V7", "func": "dominant"},
+        {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
+    ],
+    # ii - V - I (Jazz)
+    [
+        {"symbol": "Dm7", "root": "D", "quality": "m7", "notes": ["D", "F", "A", "C"], "roman": "ii7", "func": "predominant"},
+        {"symbol": "G7", "root": "G", "quality": "7", "notes": ["G", "B", "D", "F"], "roman": "V7", "func": "dominant"},
+        {"symbol": "Cmaj7", "root": "C", "quality": "maj7", "notes": ["C", "E", "G", "B"], "roman": "Imaj7", "func": "tonic"},
+        {"symbol": "Am7", "root": "A", "quality": "m7", "notes": ["A", "C", "E", "G"], "roman": "vi7", "func": "tonic"},
+    ],
+    # I - vi - IV - V (50s progression)
+    [
+        {"symbol": "C", "root": "C", "quality": "maj", "notes": ["C", "E", "G"], "roman": "I", "func": "tonic"},
+        {"symbol": "Am", "root": "A", "quality": "m", "notes": ["A", "C", "E"], "roman": "vi", "func": "tonic"},
+        {"symbol": "F", "root": "F", "quality": "maj", "notes": ["F", "A", "C"], "roman": "IV", "func": "predominant"},
+        {"symbol": "G", "root": "G", "quality": "maj", "notes": ["G", "B", "D"], "roman": "V", "func": "dominant"},
+    ],
+]
+
+MOCK_NUM_MEASURES = 16
+MOCK_GLOBAL_KEY = {"tonic": "C", "mode": "major", "signature": 0}
+
+# One canonical chord dict per progression step, already in output schema
+MOCK_CHORDS = tuple(
+    tuple(
+        {
+            "id": "",
             "symbol": chord_data["symbol"],
             "root": chord_data["root"],
             "quality": chord_data["quality"],
             "notes": chord_data["notes"],
-            "boundingBox": {
-                "x": measure_x + 0.02,
-                "y": measure_y + 0.02,
-                "width": 0.16,
-                "height": 0.12,
-            },
+            "boundingBox": None,
             "romanNumeral": chord_data["roman"],
             "function": chord_data["func"],
-            "confidence": confidence,
+            "confidence": 0.0,
             "beatPosition": 1,
         }
+        for chord_data in prog
+    )
+    for prog in MOCK_PROGRESSIONS
+)
+
+
+def _build_mock_measures() -> list:
+    """
+    Build the mock measure skeleton shared by every mock analysis.
 
-        measures.append({
+    Everything except chord confidence is independent of the file, so this
+    runs once at import and shared by every request. Each field is computed as a
+    column over all measures, then the measure dicts are assembled in one pass.
+    """
+    idx = np.arange(MOCK_NUM_MEASURES)
+    measure_xs = (idx % 4) * 0.22 + 0.06
+    measure_ys = (idx // 4) * 0.18 + 0.15
+    max_notes = max(len(c["notes"]) for prog in MOCK_CHORDS for c in prog)
+
+    inner_xs = measure_xs + 0.02
+    note_xs = (inner_xs[:, None] + np.arange(max_notes) * 0.04).tolist()
+    note_ys = (measure_ys + 0.04).tolist()
+    chord_ys = (measure_ys + 0.02).tolist()
+    inner_xs = inner_xs.tolist()
+    measure_xs = measure_xs.tolist()
+    measure_ys = measure_ys.tolist()
+
+    prog_indices = (idx // 4 % len(MOCK_CHORDS)).tolist()
+    beat_indices = (idx % 4).tolist()
+
+    # Templates are never mutated, so chords may share the canonical dicts'
+    # note lists
+    chords = [
+        {
+            **MOCK_CHORDS[p][b],
+            "id": f"chord-{i}",
+            "boundingBox": {"x": inner_xs[i], "y": chord_ys[i], "width": 0.16, "height": 0.12},
+        }
+        for i, (p, b) in enumerate(zip(prog_indices, beat_indices))
+    ]
+
+    return [
+        {
             "number": i + 1,
-            "boundingBox": {
-                "x": measure_x,
-                "y": measure_y,
-                "width": 0.20,
-                "height": 0.16,
-            },
+            "boundingBox": {"x": measure_xs[i], "y": measure_ys[i], "width": 0.20, "height": 0.16},
             "beats": [{
                 "number": 1,
                 "notes": [
                     {
                         "pitch": f"{note}4",
                         "duration": "quarter",
-                        "boundingBox": {
-                            "x": measure_x + 0.02 + idx * 0.04,
-                            "y": measure_y + 0.04,
-                            "width": 0.03,
-                            "height": 0.08,
-                        }
+                        "boundingBox": {"x": note_x, "y": note_ys[i], "width": 0.03, "height": 0.08},
                     }
-                    for idx, note in enumerate(chord_data["notes"])
+                    for note, note_x in zip(chord["notes"], note_xs[i])
                 ],
-                "chord": chord,
+                "chord": None,
             }],
-            "localKey": global_key,
+            "localKey": MOCK_GLOBAL_KEY,
             "chords": [chord],
             "timeSignature": {"numerator": 4, "denominator": 4},
-        })
+        }
+        for i, chord in enumerate(chords)
+    ]
+
+
+# Per-measure templates. Only the dicts on the path to the chord are copied
+# per request; bounding boxes, notes and time signatures are shared.
+_MOCK_TEMPLATES = tuple(_build_mock_measures())
+
+
+def _mock_measure(template: dict, confidence: float, local_key: dict) -> dict:
+    """Shallow-copy a mock measure template with its own chord and confidence."""
+    chord = {**template["chords"][0], "confidence": confidence}
+    beat = {**template["beats"][0], "chord": chord}
+    return {**template, "beats": [beat], "localKey": local_key, "chords": [chord]}
+
+
+def generate_mock_analysis(file_id: str) -> dict:
+    """
+    Generate mock analysis data with realistic chord progressions.
+
+    This simulates what real OMR + analysis would produce.
+    """
+    global_key = dict(MOCK_GLOBAL_KEY)
+
+    # Local generator seeded from an md5 of file_id: consistent results for the
+    # same file across restarts, without touching the global random state
+    seed = int.from_bytes(hashlib.md5(file_id.encode()).digest()[:4], "little")
+    rng = np.random.default_rng(seed)
+    confidences = (0.85 + 0.15 * rng.random(len(_MOCK_TEMPLATES))).tolist()
+
+    measures = [
+        _mock_measure(template, confidence, global_key)
+        for template, confidence in zip(_MOCK_TEMPLATES, confidences)
+    ]
 
     # Add modulation
     modulation = {
@@ -548,7 +810,7 @@ def generate_mock_analysis(file_id: str) -> dict:
         },
     }
 
-    return {
+    return validate_analysis({
         "id": file_id,
         "filename": "sheet_music.pdf",
         "pages": [{
@@ -562,4 +824,4 @@ def generate_mock_analysis(file_id: str) -> dict:
             "commonName": "Mixed progressions (Pop, Classic, Jazz, 50s)",
         },
         "status": "completed",
-    }
+    })
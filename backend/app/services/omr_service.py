@@ -6,22 +6,32 @@ then performs harmonic analysis on the results.
 """
 
 import os
+import shutil
 import subprocess
 import tempfile
 import asyncio
-from typing import Optional
-import json
+import multiprocessing
+import importlib.util
+from argparse import Namespace
+from concurrent.futures.process import BrokenProcessPool
+from typing import TYPE_CHECKING, Optional, Union
+import aiofiles
+import numpy as np
 
-# Try to import OMR and music analysis libraries
-try:
-    from music21 import converter, stream, chord, key, roman, note, meter
-    HAS_MUSIC21 = True
-except ImportError:
-    HAS_MUSIC21 = False
+from app.services.executors import run_in_cpu_pool
+
+# music21 and oemer are slow to import, so only check for them here and
+# import on first use
+HAS_MUSIC21 = importlib.util.find_spec("music21") is not None
+HAS_OEMER = importlib.util.find_spec("oemer") is not None
+
+if TYPE_CHECKING:
+    from multiprocessing.connection import Connection
+
+    from music21 import chord, key, stream
 
 try:
     import cv2
-    import numpy as np
     HAS_CV2 = True
 except ImportError:
     HAS_CV2 = False
@@ -29,61 +39,208 @@ except ImportError:
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 
-
-async def run_omr(image_path: str, output_dir: str) -> Optional[str]:
+# Measure detection downsamples pages to about this many pixels on the short side
+DETECT_MIN_SIDE = 500
+
+# Sharps (+) or flats (-) in each key signature, keyed by tonic; minor keys
+# are lowercase
+KEY_SIGNATURE_COUNTS = {
+    'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'C#': 7,
+    'e': 1, 'b': 2, 'f#': 3, 'c#': 4, 'g#': 5, 'd#': 6, 'a#': 7,
+    'F': -1, 'Bb': -2, 'Eb': -3, 'Ab': -4, 'Db': -5, 'Gb': -6, 'Cb': -7,
+    'd': -1, 'g': -2, 'c': -3, 'f': -4, 'bb': -5, 'eb': -6, 'ab': -7,
+}
+
+# Aarden-Essen key profiles for C major and C minor, the weights music21's
+# analyze('key') uses. Row 12*m + t is the mean-centered profile of mode m
+# (0 major, 1 minor) rotated to tonic pitch class t.
+_KEY_WEIGHTS = np.array([
+    [17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587,
+     0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122],
+    [18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362,
+     0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623],
+])
+_KEY_PROFILES = np.array([
+    np.roll(weights - weights.mean(), tonic)
+    for weights in _KEY_WEIGHTS
+    for tonic in range(12)
+])
+_KEY_PROFILE_NORMS = np.linalg.norm(_KEY_PROFILES, axis=1)
+
+# Per-page OMR time limit, in seconds
+OMR_TIMEOUT = 300
+
+# oemer output is staged in a per-page temp directory under tmpfs when there
+# is one, otherwise under the system default temp directory
+OMR_WORK_ROOT = "/dev/shm" if os.access("/dev/shm", os.W_OK) else None
+
+# Harmonic function of each bare scale degree, and the accidentals stripped
+# from an upper-cased Roman numeral (after its quality words) to reach one
+_DEGREE_FUNCTIONS = {
+    'I': 'tonic', 'III': 'tonic', 'VI': 'tonic',
+    'II': 'predominant', 'IV': 'predominant',
+    'V': 'dominant', 'VII': 'dominant',
+}
+_STRIP_ACCIDENTALS = str.maketrans('', '', '#B+°')
+
+# Chord analyses keyed by (pitch names, bass, key tonic, key mode), evicted
+# oldest first beyond RN_CACHE_SIZE entries
+RN_CACHE_SIZE = 10_000
+_RN_CACHE: dict[tuple, tuple] = {}
+
+
+async def run_omr(image_path: str) -> Optional[dict]:
     """
-    Run oemer OMR on an image file.
+    Run oemer OMR on an image file and parse the MusicXML it produces.
+
+    Runs in the shared CPU process pool. The worker runs oemer in a child
+    process when it is importable, or else through the oemer CLI, and kills
+    either one if it runs past OMR_TIMEOUT. The limit only counts time
+    spent running oemer, since calls wait for a free worker before they are
+    submitted. The CLI is also the fallback when in-process oemer fails,
+    e.g. before its checkpoints have been downloaded.
 
     Args:
         image_path: Path to the sheet music image
-        output_dir: Directory to save the MusicXML output
 
     Returns:
-        Path to the generated MusicXML file, or None if failed
+        Parsed music data (see parse_musicxml), or None if OMR failed
     """
-    def _run_oemer():
-        try:
-            # Run oemer CLI
-            result = subprocess.run(
-                ["oemer", image_path, "-o", output_dir],
-                capture_output=True,
-                text=True,
-                timeout=300  # 5 minute timeout
-            )
-
-            if result.returncode != 0:
-                print(f"oemer error: {result.stderr}")
-                return None
-
-            # Find the output MusicXML file
-            base_name = os.path.splitext(os.path.basename(image_path))[0]
-            musicxml_path = os.path.join(output_dir, f"{base_name}.musicxml")
-
-            if os.path.exists(musicxml_path):
-                return musicxml_path
-
-            # Try alternative extensions
-            for ext in ['.xml', '.mxl']:
-                alt_path = os.path.join(output_dir, f"{base_name}{ext}")
-                if os.path.exists(alt_path):
-                    return alt_path
-
-            # Check if any musicxml was created
-            for f in os.listdir(output_dir):
-                if f.endswith(('.musicxml', '.xml', '.mxl')):
-                    return os.path.join(output_dir, f)
+    try:
+        return await run_in_cpu_pool(_recognize_page, image_path)
+    except BrokenProcessPool as e:
+        print(f"oemer worker failed: {e}")
+        return None
+
+
+def _recognize_page(image_path: str) -> Optional[dict]:
+    """
+    Run oemer on a page and parse its output, in a CPU pool worker.
+
+    oemer writes into a fresh per-page temp directory, on tmpfs where
+    available, and the MusicXML is parsed straight from there. Nothing is
+    written to the upload directory, and the temp directory is removed
+    once parsing is done.
+    """
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+    work_dir = tempfile.mkdtemp(prefix=f"omr_{base_name}_", dir=OMR_WORK_ROOT)
 
+    try:
+        musicxml_path = _run_oemer(image_path, work_dir)
+        if musicxml_path is None:
             return None
+        return parse_musicxml(musicxml_path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
 
+def _run_oemer(image_path: str, output_dir: str) -> Optional[str]:
+    """Run oemer in a CPU pool worker, in a child process if possible, else via the CLI."""
+    if HAS_OEMER:
+        try:
+            return _run_oemer_in_process(image_path, output_dir)
         except subprocess.TimeoutExpired:
             print("oemer timed out")
             return None
         except Exception as e:
-            print(f"oemer exception: {e}")
+            print(f"oemer in-process error, falling back to CLI: {e}")
+
+    return _run_oemer_cli(image_path, output_dir)
+
+
+def _run_oemer_in_process(image_path: str, output_dir: str) -> Optional[str]:
+    """
+    Run oemer's extraction pipeline in a child process of this worker.
+
+    A call running in the worker itself couldn't be stopped, so oemer runs
+    in a child that is killed if it doesn't finish within OMR_TIMEOUT.
+    Raises subprocess.TimeoutExpired in that case.
+    """
+    context = multiprocessing.get_context("spawn")
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_extract_with_oemer, args=(image_path, output_dir, sender))
+    process.start()
+    sender.close()
+
+    try:
+        if not receiver.poll(OMR_TIMEOUT):
+            raise subprocess.TimeoutExpired("oemer", OMR_TIMEOUT)
+        try:
+            musicxml_path, error = receiver.recv()
+        except EOFError:
+            raise RuntimeError("oemer process exited without a result")
+    finally:
+        # Stops oemer if it is still running, e.g. after a timeout
+        process.kill()
+        process.join()
+        receiver.close()
+
+    if error is not None:
+        raise RuntimeError(error)
+    return musicxml_path if os.path.exists(musicxml_path) else None
+
+
+def _extract_with_oemer(image_path: str, output_dir: str, conn: "Connection") -> None:
+    """Run oemer in a child process, sending back (musicxml_path, error)."""
+    try:
+        from oemer import ete
+
+        musicxml_path = ete.extract(Namespace(
+            img_path=image_path,
+            output_path=output_dir,
+            use_tf=False,
+            save_cache=False,
+            without_deskew=False,
+        ))
+        conn.send((musicxml_path, None))
+    except Exception as e:
+        conn.send((None, str(e)))
+    finally:
+        conn.close()
+
+
+def _run_oemer_cli(image_path: str, output_dir: str) -> Optional[str]:
+    """
+    Run the oemer CLI in a subprocess and locate its MusicXML output.
+
+    output_dir is a fresh per-page directory, so finding the output never
+    picks up another page's file.
+    """
+    base_name = os.path.splitext(os.path.basename(image_path))[0]
+
+    try:
+        # Run oemer CLI
+        result = subprocess.run(
+            ["oemer", image_path, "-o", output_dir],
+            capture_output=True,
+            text=True,
+            timeout=OMR_TIMEOUT
+        )
+
+        if result.returncode != 0:
+            print(f"oemer error: {result.stderr}")
             return None
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _run_oemer)
+        # Find the output MusicXML file, preferring the expected name
+        outputs = [f for f in os.listdir(output_dir) if f.endswith(('.musicxml', '.xml', '.mxl'))]
+        if not outputs:
+            return None
+
+        for ext in ['.musicxml', '.xml', '.mxl']:
+            if f"{base_name}{ext}" in outputs:
+                output_name = f"{base_name}{ext}"
+                break
+        else:
+            output_name = outputs[0]
+
+        return os.path.join(output_dir, output_name)
+
+    except subprocess.TimeoutExpired:
+        print("oemer timed out")
+        return None
+    except Exception as e:
+        print(f"oemer exception: {e}")
+        return None
 
 
 def parse_musicxml(musicxml_path: str) -> dict:
@@ -99,20 +256,18 @@ def parse_musicxml(musicxml_path: str) -> dict:
     if not HAS_MUSIC21:
         return {"error": "music21 not available"}
 
-    try:
-        score = converter.parse(musicxml_path)
+    from music21 import stream, meter
 
-        # Detect key signature
-        detected_key = score.analyze('key')
+    try:
+        score, detected_key = _parse_score(musicxml_path)
         key_info = {
             "tonic": detected_key.tonic.name if detected_key.tonic else "C",
             "mode": detected_key.mode if detected_key.mode else "major",
             "signature": get_key_signature_count(detected_key)
         }
 
-        # Get time signature
-        time_sigs = score.recurse().getElementsByClass(meter.TimeSignature)
-        time_sig = time_sigs[0] if time_sigs else None
+        # Get time signature, stopping at the first one found
+        time_sig = score.recurse().getElementsByClass(meter.TimeSignature).first()
         time_info = {
             "numerator": time_sig.numerator if time_sig else 4,
             "denominator": time_sig.denominator if time_sig else 4
@@ -126,22 +281,7 @@ def parse_musicxml(musicxml_path: str) -> dict:
                 measure_num = measure.number if measure.number else measure_idx + 1
 
                 # Get notes in this measure
-                notes_in_measure = []
-                for element in measure.recurse().notesAndRests:
-                    if isinstance(element, note.Note):
-                        notes_in_measure.append({
-                            "pitch": element.nameWithOctave,
-                            "duration": element.duration.type,
-                            "offset": float(element.offset),
-                            "midi": element.pitch.midi
-                        })
-                    elif isinstance(element, chord.Chord):
-                        notes_in_measure.append({
-                            "pitches": [p.nameWithOctave for p in element.pitches],
-                            "duration": element.duration.type,
-                            "offset": float(element.offset),
-                            "is_chord": True
-                        })
+                notes_in_measure = _measure_notes(measure)
 
                 # Analyze chords in the measure
                 chords_in_measure = analyze_measure_harmony(measure, detected_key)
@@ -165,35 +305,141 @@ def parse_musicxml(musicxml_path: str) -> dict:
         return {"error": str(e)}
 
 
-def analyze_measure_harmony(measure: stream.Measure, current_key: key.Key) -> list:
+def _measure_notes(measure: "stream.Measure") -> list:
+    """
+    Extract note and chord data from a measure in a single pass.
+
+    Each note's pitch is read once and shared between its name and MIDI
+    number, rather than going through music21's Note properties twice.
+    Elements are told apart by music21's isNote/isChord class flags,
+    which are cheaper than isinstance checks.
+    """
+    # Without voices a measure holds its notes directly, so the recursive
+    # walk is only needed for multi-voice measures
+    elements = measure.recurse().notesAndRests if measure.hasVoices() else measure.notesAndRests
+
+    notes_in_measure = []
+    for element in elements:
+        if element.isNote:
+            pitch = element.pitch
+            notes_in_measure.append({
+                "pitch": pitch.nameWithOctave,
+                "duration": element.duration.type,
+                "offset": float(element.offset),
+                "midi": pitch.midi
+            })
+        elif element.isChord:
+            notes_in_measure.append({
+                "pitches": [p.nameWithOctave for p in element.pitches],
+                "duration": element.duration.type,
+                "offset": float(element.offset),
+                "is_chord": True
+            })
+
+    return notes_in_measure
+
+
+def _parse_score(musicxml_path: str) -> tuple:
+    """
+    Parse a MusicXML file and detect its key.
+
+    forceSource and storePickle skip music21's pickle cache, which would
+    otherwise freeze the score to its scratch directory and thaw it back.
+    Going through the file parser handles compressed .mxl and any text
+    encoding the file declares.
+    """
+    from music21 import converter
+
+    score = converter.parse(musicxml_path, forceSource=True, storePickle=False)
+    return score, _estimate_key(score)
+
+
+def _estimate_key(score: "stream.Score") -> "key.Key":
+    """
+    Estimate the key of a score.
+
+    Same Krumhansl-Schmuckler correlation against Aarden-Essen profiles as
+    score.analyze('key'), computed on a NumPy pitch-class histogram in one
+    pass over the notes. This skips music21's two flatten() copies of the
+    score and its 23 alternative Key objects. Scores with no notes or a
+    flat histogram fall back to music21.
+    """
+    from music21 import analysis, key, note, pitch
+
+    histogram = np.zeros(12)
+    for n in score.recurse().notes:
+        if isinstance(n, note.Unpitched):
+            continue
+        length = float(n.quarterLength)
+        for p in n.pitches:
+            histogram[p.pitchClass] += length
+
+    centered = histogram - histogram.mean()
+    histogram_norm = np.linalg.norm(centered)
+    if not histogram_norm:
+        return score.analyze('key')
+
+    correlations = (_KEY_PROFILES @ centered) / (_KEY_PROFILE_NORMS * histogram_norm)
+    best = int(np.argmax(correlations))
+    mode = 'major' if best < 12 else 'minor'
+
+    # Respell the tonic the way music21 does, e.g. G# major as A- major
+    tonic = pitch.Pitch(best % 12)
+    valid = analysis.discrete.KeyWeightKeyAnalysis.keysValidMajor if mode == 'major' \
+        else analysis.discrete.KeyWeightKeyAnalysis.keysValidMinor
+    if tonic.name not in valid:
+        tonic.getEnharmonic(inPlace=True)
+
+    detected_key = key.Key(tonic=tonic, mode=mode)
+    detected_key.correlationCoefficient = float(correlations[best])
+    return detected_key
+
+
+def analyze_measure_harmony(measure: "stream.Measure", current_key: "key.Key") -> list:
     """
     Analyze the harmony in a measure, detecting chords and their functions.
     """
+    from music21 import chord
+
     chords_found = []
 
     try:
+        # A single voice without chords or grace notes never sounds two
+        # notes at once, so chordify could only produce one-note "chords"
+        if not measure.hasVoices() and not any(
+            n.isChord or n.duration.isGrace for n in measure.notes
+        ):
+            return chords_found
+
         # Use music21's chord reduction
         chordified = measure.chordify()
 
         for element in chordified.recurse().getElementsByClass(chord.Chord):
             if len(element.pitches) >= 2:  # At least 2 notes for a chord
-                # Get chord symbol
-                chord_symbol = element.pitchedCommonName or element.commonName
-
-                # Get Roman numeral analysis
-                try:
-                    rn = roman.romanNumeralFromChord(element, current_key)
-                    roman_numeral = rn.romanNumeral
-                    chord_function = get_chord_function(roman_numeral)
-                except:
-                    roman_numeral = "?"
-                    chord_function = "unknown"
+                notes = [p.name for p in element.pitches]
+
+                # Tonal music repeats a handful of chord shapes, so the
+                # music21 analysis is done once per shape and key
+                cache_key = (
+                    tuple(sorted(set(notes))),
+                    element.bass().name,
+                    current_key.tonic.name,
+                    current_key.mode,
+                )
+                analysis = _RN_CACHE.get(cache_key)
+                if analysis is None:
+                    analysis = _analyze_chord_shape(element, current_key)
+                    if len(_RN_CACHE) >= RN_CACHE_SIZE:
+                        del _RN_CACHE[next(iter(_RN_CACHE))]
+                    _RN_CACHE[cache_key] = analysis
+
+                symbol, root, quality, roman_numeral, chord_function = analysis
 
                 chords_found.append({
-                    "symbol": simplify_chord_name(element),
-                    "root": element.root().name if element.root() else "?",
-                    "quality": element.quality,
-                    "notes": [p.name for p in element.pitches],
+                    "symbol": symbol,
+                    "root": root,
+                    "quality": quality,
+                    "notes": notes,
                     "romanNumeral": roman_numeral,
                     "function": chord_function,
                     "offset": float(element.offset),
@@ -205,7 +451,29 @@ def analyze_measure_harmony(measure: stream.Measure, current_key: key.Key) -> li
     return chords_found
 
 
-def simplify_chord_name(c: chord.Chord) -> str:
+def _analyze_chord_shape(c: "chord.Chord", current_key: "key.Key") -> tuple:
+    """Symbol, root, quality, Roman numeral and function of a chord in a key."""
+    from music21 import roman
+
+    try:
+        rn = roman.romanNumeralFromChord(c, current_key)
+        roman_numeral = rn.romanNumeral
+        chord_function = get_chord_function(roman_numeral)
+    except:
+        roman_numeral = "?"
+        chord_function = "unknown"
+
+    root = c.root()
+    return (
+        simplify_chord_name(c),
+        root.name if root else "?",
+        c.quality,
+        roman_numeral,
+        chord_function,
+    )
+
+
+def simplify_chord_name(c: "chord.Chord") -> str:
     """
     Create a simplified chord symbol from a music21 chord.
     """
@@ -240,57 +508,34 @@ def simplify_chord_name(c: chord.Chord) -> str:
 def get_chord_function(roman_numeral: str) -> str:
     """Determine harmonic function from Roman numeral."""
     base = roman_numeral.upper().replace('7', '').replace('MAJ', '').replace('DIM', '').replace('AUG', '')
-    base = base.replace('#', '').replace('B', '').replace('+', '').replace('°', '')
-
-    tonic_degrees = ['I', 'III', 'VI']
-    predominant_degrees = ['II', 'IV']
-    dominant_degrees = ['V', 'VII']
-
-    if base in tonic_degrees:
-        return 'tonic'
-    elif base in predominant_degrees:
-        return 'predominant'
-    elif base in dominant_degrees:
-        return 'dominant'
+    function = _DEGREE_FUNCTIONS.get(base.translate(_STRIP_ACCIDENTALS))
+
+    if function is not None:
+        return function
     elif '/' in roman_numeral:
         return 'secondary_dominant'
     else:
         return 'unknown'
 
 
-def get_key_signature_count(k: key.Key) -> int:
+def get_key_signature_count(k: "key.Key") -> int:
     """Get number of sharps (+) or flats (-) in key signature."""
     if not k:
         return 0
 
-    sharps_order = ['F#', 'C#', 'G#', 'D#', 'A#', 'E#', 'B#']
-    flats_order = ['Bb', 'Eb', 'Ab', 'Db', 'Gb', 'Cb', 'Fb']
-
-    key_sharps = {
-        'G': 1, 'D': 2, 'A': 3, 'E': 4, 'B': 5, 'F#': 6, 'C#': 7,
-        'e': 1, 'b': 2, 'f#': 3, 'c#': 4, 'g#': 5, 'd#': 6, 'a#': 7
-    }
-    key_flats = {
-        'F': -1, 'Bb': -2, 'Eb': -3, 'Ab': -4, 'Db': -5, 'Gb': -6, 'Cb': -7,
-        'd': -1, 'g': -2, 'c': -3, 'f': -4, 'bb': -5, 'eb': -6, 'ab': -7
-    }
-
-    tonic = k.tonic.name if k.tonic else 'C'
+    # music21 spells flats with '-' (e.g. 'B-')
+    tonic = k.tonic.name.replace('-', 'b') if k.tonic else 'C'
     if k.mode == 'minor':
         tonic = tonic.lower()
 
-    if tonic in key_sharps:
-        return key_sharps[tonic]
-    elif tonic in key_flats:
-        return key_flats[tonic]
-
-    return 0
+    return KEY_SIGNATURE_COUNTS.get(tonic, 0)
 
 
-async def detect_measure_positions(image_path: str) -> list:
+async def detect_measure_positions(image: Union[str, bytes]) -> list:
     """
     Detect measure/barline positions in the image using computer vision.
 
+    Accepts an image path or encoded image bytes already in memory.
     Returns list of bounding boxes for each detected measure.
     """
     if not HAS_CV2:
@@ -298,48 +543,61 @@ async def detect_measure_positions(image_path: str) -> list:
 
     def _detect():
         try:
-            img = cv2.imread(image_path)
-            if img is None:
+            if isinstance(image, bytes):
+                gray = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_GRAYSCALE)
+            else:
+                gray = cv2.imread(image, cv2.IMREAD_GRAYSCALE)
+            if gray is None:
                 return []
 
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            height, width = gray.shape
-
-            # Detect vertical lines (barlines)
-            # Use morphological operations to find vertical lines
-            vertical_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (1, height // 10))
-            vertical_lines = cv2.morphologyEx(255 - gray, cv2.MORPH_OPEN, vertical_kernel)
-
-            # Threshold
-            _, thresh = cv2.threshold(vertical_lines, 50, 255, cv2.THRESH_BINARY)
-
-            # Find contours
-            contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            # Filter for barlines (tall, thin vertical lines)
-            barlines = []
-            for cnt in contours:
-                x, y, w, h = cv2.boundingRect(cnt)
-                aspect_ratio = h / max(w, 1)
-                if aspect_ratio > 5 and h > height * 0.1:  # Tall and thin
-                    barlines.append(x)
-
-            barlines = sorted(set(barlines))
-
-            # Detect staff lines to get vertical bounds
-            horizontal_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (width // 5, 1))
-            horizontal_lines = cv2.morphologyEx(255 - gray, cv2.MORPH_OPEN, horizontal_kernel)
-            _, h_thresh = cv2.threshold(horizontal_lines, 50, 255, cv2.THRESH_BINARY)
-            h_contours, _ = cv2.findContours(h_thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            # Group staff lines into systems
-            staff_ys = []
-            for cnt in h_contours:
-                x, y, w, h = cv2.boundingRect(cnt)
-                if w > width * 0.3:  # Long horizontal line
-                    staff_ys.append(y)
-
-            staff_ys = sorted(staff_ys)
+            # Line positions only need to be accurate to a few pixels, so
+            # work on a copy with the shorter side scaled down to ~500px.
+            # The image is binarized first and downsampled by keeping any
+            # ink in each block, so thin staff lines and barlines survive.
+            # Thresholds write into their input, so the decoded full-size
+            # buffer is the only full-size allocation.
+            scale = max(1, min(gray.shape) // DETECT_MIN_SIDE)
+            _, ink = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY_INV, dst=gray)
+            if scale > 1:
+                small_size = (gray.shape[1] // scale, gray.shape[0] // scale)
+                ink = cv2.resize(ink, small_size, interpolation=cv2.INTER_AREA)
+            cv2.threshold(ink, 0, 1, cv2.THRESH_BINARY, dst=ink)
+
+            height, width = ink.shape
+            margin = 20 / scale
+
+            # Barlines: columns with an unbroken run of ink at least a tenth of
+            # the page tall. A running count down each column finds these in
+            # one pass; total column ink alone would also count stems and
+            # the staff lines crossing every column.
+            run = max(height // 10, 1)
+            counts = np.zeros((height + 1, width), dtype=np.int32)
+            np.cumsum(ink, axis=0, out=counts[1:])
+            window = np.subtract(counts[run:], counts[:-run])
+            bar_cols = np.flatnonzero(window.max(axis=0) == run)
+
+            # Staff lines: rows with an unbroken run of ink at least a fifth
+            # of the page wide, found the same way along each row. A line of
+            # text can put as much ink in a row, but never in one long run.
+            run = max(width // 5, 1)
+            counts = np.zeros((height, width + 1), dtype=np.int32)
+            np.cumsum(ink, axis=1, out=counts[:, 1:])
+            window = np.subtract(counts[:, run:], counts[:, :-run])
+            staff_rows = np.flatnonzero(window.max(axis=1) == run)
+
+            # A double or thick barline spans several columns; merge those
+            # with a gap that scales with the page width
+            barlines = np.array(_cluster_positions(bar_cols, gap=max(3, width * 0.005)))
+            staff_ys = _cluster_positions(staff_rows)
+
+            # Measures lie between consecutive barlines at least 2% of the
+            # page width apart
+            bar_gaps = np.diff(barlines)
+            wide = bar_gaps > width * 0.02
+            measure_spans = list(zip(
+                (barlines[:-1][wide] / width).tolist(),
+                (bar_gaps[wide] / width).tolist(),
+            ))
 
             # Create measure bounding boxes
             measures = []
@@ -358,30 +616,24 @@ async def detect_measure_positions(image_path: str) -> list:
                     systems.append(current_system)
 
                     for system in systems:
-                        system_top = min(system) - 20
-                        system_bottom = max(system) + 20
+                        system_top = min(system) - margin
+                        system_bottom = max(system) + margin
                         system_height = system_bottom - system_top
 
-                        for i in range(len(barlines) - 1):
-                            x1, x2 = barlines[i], barlines[i + 1]
-                            if x2 - x1 > width * 0.02:  # Minimum measure width
-                                measures.append({
-                                    "x": x1 / width,
-                                    "y": system_top / height,
-                                    "width": (x2 - x1) / width,
-                                    "height": system_height / height
-                                })
+                        measures.extend({
+                            "x": x,
+                            "y": system_top / height,
+                            "width": span,
+                            "height": system_height / height
+                        } for x, span in measure_spans)
                 else:
                     # No staff lines detected, use full height
-                    for i in range(len(barlines) - 1):
-                        x1, x2 = barlines[i], barlines[i + 1]
-                        if x2 - x1 > width * 0.02:
-                            measures.append({
-                                "x": x1 / width,
-                                "y": 0.1,
-                                "width": (x2 - x1) / width,
-                                "height": 0.8
-                            })
+                    measures.extend({
+                        "x": x,
+                        "y": 0.1,
+                        "width": span,
+                        "height": 0.8
+                    } for x, span in measure_spans)
 
             return measures
 
@@ -393,6 +645,14 @@ async def detect_measure_positions(image_path: str) -> list:
     return await loop.run_in_executor(None, _detect)
 
 
+def _cluster_positions(indices: "np.ndarray", gap: float = 3) -> list:
+    """Merge runs of nearby pixel indices, e.g. one thick line, into their mean position."""
+    if not len(indices):
+        return []
+    groups = np.split(indices, np.flatnonzero(np.diff(indices) > gap) + 1)
+    return [float(group.mean()) for group in groups]
+
+
 async def process_page_with_omr(file_id: str, page_num: int) -> dict:
     """
     Process a single page with OMR and return analysis results.
@@ -400,19 +660,25 @@ async def process_page_with_omr(file_id: str, page_num: int) -> dict:
     upload_path = os.path.join(UPLOAD_DIR, file_id)
     image_path = os.path.join(upload_path, f"page_{page_num}.png")
 
-    if not os.path.exists(image_path):
+    # Read the page once; measure detection decodes it from memory while
+    # oemer, which only takes a path, reads the file itself
+    try:
+        async with aiofiles.open(image_path, 'rb') as f:
+            image_bytes = await f.read()
+    except FileNotFoundError:
         return {"error": f"Page image not found: {image_path}"}
 
-    # Run OMR to get MusicXML
-    musicxml_path = await run_omr(image_path, upload_path)
-
-    # Detect measure positions from image
-    measure_positions = await detect_measure_positions(image_path)
-
-    # Parse MusicXML if OMR succeeded
-    if musicxml_path and os.path.exists(musicxml_path):
-        music_data = parse_musicxml(musicxml_path)
-
+    # Run OMR and parse its MusicXML while detecting measure positions.
+    # Only the detection call keeps the page bytes, so they are freed once
+    # it returns instead of staying alive for the whole OMR run.
+    detection = detect_measure_positions(image_bytes)
+    del image_bytes
+    music_data, measure_positions = await asyncio.gather(
+        run_omr(image_path),
+        detection,
+    )
+
+    if music_data is not None:
         # Merge position data with music data
         if measure_positions and music_data.get("measures"):
             for i, measure in enumerate(music_data["measures"]):
@@ -452,9 +718,14 @@ async def full_analysis(file_id: str, num_pages: int = 1) -> dict:
 
     all_roman_numerals = []
 
-    for page_num in range(1, num_pages + 1):
-        page_result = await process_page_with_omr(file_id, page_num)
+    # Pages are independent, so process them concurrently; gather keeps
+    # results in page order
+    page_results = await asyncio.gather(*(
+        process_page_with_omr(file_id, page_num)
+        for page_num in range(1, num_pages + 1)
+    ))
 
+    for page_num, page_result in enumerate(page_results, start=1):
         if "error" not in page_result:
             # Set global key from first page
             if results["globalKey"] is None and page_result.get("globalKey"):
@@ -6,7 +6,9 @@ Converts PDF pages to images for display and analysis.
 
 import os
 import asyncio
-from typing import Optional
+from aiofiles.os import path as aio_path
+
+from app.services.executors import RENDER_POOL_SIZE, get_io_pool, run_in_render_pool
 
 # Try to import PDF processing libraries
 try:
@@ -24,6 +26,9 @@ except ImportError:
 
 UPLOAD_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "uploads")
 
+# Documents with at least this many pages are rendered across processes
+PARALLEL_RENDER_MIN_PAGES = 4
+
 
 async def process_pdf(file_id: str, pdf_path: str) -> dict:
     """
@@ -53,12 +58,48 @@ async def process_pdf(file_id: str, pdf_path: str) -> dict:
 
 
 async def _process_with_pymupdf(pdf_path: str, output_dir: str) -> dict:
-    """Process PDF using PyMuPDF (faster, no external dependencies)."""
-    def _process():
-        doc = fitz.open(pdf_path)
-        images = []
+    """
+    Process PDF using PyMuPDF (faster, no external dependencies).
 
-        for page_num in range(len(doc)):
+    Longer documents are split into contiguous page ranges rendered in the
+    rendering process pool, each with its own document handle. PyMuPDF is
+    not thread-safe, so processes are used rather than threads. That pool
+    is separate from the CPU pool, so uploads don't queue behind OMR.
+    """
+    loop = asyncio.get_event_loop()
+
+    # Run in the I/O thread pool to not block async loop
+    page_count = await loop.run_in_executor(get_io_pool(), _page_count, pdf_path)
+    workers = min(RENDER_POOL_SIZE, page_count)
+
+    if workers < 2 or page_count < PARALLEL_RENDER_MIN_PAGES:
+        images = await loop.run_in_executor(
+            get_io_pool(), _render_pages, pdf_path, output_dir, range(page_count)
+        )
+    else:
+        step = -(-page_count // workers)
+        chunks = [range(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+        chunk_images = await asyncio.gather(*(
+            run_in_render_pool(_render_pages, pdf_path, output_dir, chunk)
+            for chunk in chunks
+        ))
+        images = [image_path for chunk in chunk_images for image_path in chunk]
+
+    return {"page_count": len(images), "images": images}
+
+
+def _page_count(pdf_path: str) -> int:
+    """Count the pages in a PDF."""
+    with fitz.open(pdf_path) as doc:
+        return len(doc)
+
+
+def _render_pages(pdf_path: str, output_dir: str, page_numbers: range) -> list:
+    """Render a range of PDF pages to PNG files, returning their paths."""
+    images = []
+
+    with fitz.open(pdf_path) as doc:
+        for page_num in page_numbers:
             page = doc.load_page(page_num)
             # Render at 2x resolution for clarity
             mat = fitz.Matrix(2.0, 2.0)
@@ -68,12 +109,7 @@ async def _process_with_pymupdf(pdf_path: str, output_dir: str) -> dict:
             pix.save(image_path)
             images.append(image_path)
 
-        doc.close()
-        return {"page_count": len(images), "images": images}
-
-    # Run in thread pool to not block async loop
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _process)
+    return images
 
 
 async def _process_with_pdf2image(pdf_path: str, output_dir: str) -> dict:
@@ -90,7 +126,7 @@ async def _process_with_pdf2image(pdf_path: str, output_dir: str) -> dict:
         return {"page_count": len(image_paths), "images": image_paths}
 
     loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None, _process)
+    return await loop.run_in_executor(get_io_pool(), _process)
 
 
 async def get_page_count(file_id: str) -> int:
@@ -98,7 +134,7 @@ async def get_page_count(file_id: str) -> int:
     upload_path = os.path.join(UPLOAD_DIR, file_id)
 
     # Count PNG files
-    if os.path.exists(upload_path):
+    if await aio_path.exists(upload_path):
         png_files = [f for f in os.listdir(upload_path) if f.endswith('.png')]
         return len(png_files)
 
@@ -0,0 +1,67 @@
+"""
+In-memory registry of uploads and analyses known to exist on disk.
+
+Lets hot request paths skip stat() calls once a file has been seen. Each
+registry is a small LRU holding the most recently used REGISTRY_SIZE ids.
+"""
+
+from collections import OrderedDict
+
+from aiofiles.os import path as aio_path
+
+REGISTRY_SIZE = 1024
+
+_KNOWN_UPLOADS: OrderedDict[str, None] = OrderedDict()
+_KNOWN_ANALYSES: OrderedDict[str, None] = OrderedDict()
+
+
+def _remember(known: OrderedDict, file_id: str) -> None:
+    """Add file_id as most recently used, evicting the oldest beyond REGISTRY_SIZE."""
+    known[file_id] = None
+    known.move_to_end(file_id)
+    if len(known) > REGISTRY_SIZE:
+        known.popitem(last=False)
+
+
+def _is_known(known: OrderedDict, file_id: str) -> bool:
+    """Check for file_id, marking it as most recently used on a hit."""
+    if file_id in known:
+        known.move_to_end(file_id)
+        return True
+    return False
+
+
+def mark_upload(file_id: str) -> None:
+    """Record that the upload directory for file_id exists."""
+    _remember(_KNOWN_UPLOADS, file_id)
+
+
+def mark_analysis(file_id: str) -> None:
+    """Record that analysis.json for file_id has been written."""
+    _remember(_KNOWN_ANALYSES, file_id)
+
+
+def forget(file_id: str) -> None:
+    """Drop file_id after its files turned out to be missing, so the next check hits disk."""
+    _KNOWN_UPLOADS.pop(file_id, None)
+    _KNOWN_ANALYSES.pop(file_id, None)
+
+
+async def upload_exists(file_id: str, upload_path: str) -> bool:
+    """Check whether an upload exists, only touching disk on a registry miss."""
+    if _is_known(_KNOWN_UPLOADS, file_id):
+        return True
+    if await aio_path.exists(upload_path):
+        _remember(_KNOWN_UPLOADS, file_id)
+        return True
+    return False
+
+
+async def analysis_exists(file_id: str, analysis_path: str) -> bool:
+    """Check whether analysis.json exists, only touching disk on a registry miss."""
+    if _is_known(_KNOWN_ANALYSES, file_id):
+        return True
+    if await aio_path.exists(analysis_path):
+        _remember(_KNOWN_ANALYSES, file_id)
+        return True
+    return False
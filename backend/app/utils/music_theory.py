@@ -13,6 +13,10 @@ ENHARMONIC = {
     'E#': 'F', 'B#': 'C',
 }
 
+# Pitch class of every note name, including enharmonic spellings
+CHROMATIC_INDEX = {note: i for i, note in enumerate(CHROMATIC_NOTES)}
+CHROMATIC_INDEX.update({alias: CHROMATIC_INDEX[note] for alias, note in ENHARMONIC.items()})
+
 # Interval names
 INTERVALS = {
     0: 'unison',
@@ -64,6 +68,15 @@ COMMON_PROGRESSIONS = {
     ('I', 'V', 'vi', 'iii', 'IV'): 'Canon progression',
 }
 
+# Chord quality for each exact interval set
+_QUALITY_TABLE = {frozenset(template): quality for quality, template in CHORD_INTERVALS.items()}
+
+# Common progressions grouped by their first numeral, in priority order
+_PROGRESSIONS_BY_FIRST = {
+    first: tuple((pattern, name) for pattern, name in COMMON_PROGRESSIONS.items() if pattern[0] == first)
+    for first in {pattern[0] for pattern in COMMON_PROGRESSIONS}
+}
+
 
 def normalize_note(note: str) -> str:
     """Convert a note to its canonical form (using sharps)."""
@@ -74,10 +87,10 @@ def normalize_note(note: str) -> str:
 
 def note_to_midi(note: str, octave: int = 4) -> int:
     """Convert note name and octave to MIDI number."""
-    note = normalize_note(note)
-    if note in CHROMATIC_NOTES:
-        return CHROMATIC_NOTES.index(note) + (octave + 1) * 12
-    return 60  # Default to middle C
+    idx = CHROMATIC_INDEX.get(note)
+    if idx is None:
+        return 60  # Default to middle C
+    return idx + (octave + 1) * 12
 
 
 def midi_to_note(midi: int) -> tuple:
@@ -89,25 +102,22 @@ def midi_to_note(midi: int) -> tuple:
 
 def get_interval(note1: str, note2: str) -> int:
     """Get interval in semitones between two notes."""
-    n1 = normalize_note(note1)
-    n2 = normalize_note(note2)
+    idx1 = CHROMATIC_INDEX.get(note1)
+    idx2 = CHROMATIC_INDEX.get(note2)
 
-    if n1 not in CHROMATIC_NOTES or n2 not in CHROMATIC_NOTES:
+    if idx1 is None or idx2 is None:
         return 0
 
-    idx1 = CHROMATIC_NOTES.index(n1)
-    idx2 = CHROMATIC_NOTES.index(n2)
-
     return (idx2 - idx1) % 12
 
 
 def get_chord_quality(intervals: list) -> str:
     """Determine chord quality from intervals."""
-    intervals = sorted(set(intervals))
+    intervals = frozenset(intervals)
 
-    for quality, template in CHORD_INTERVALS.items():
-        if intervals == template:
-            return quality
+    quality = _QUALITY_TABLE.get(intervals)
+    if quality is not None:
+        return quality
 
     # Check partial matches
     if 0 in intervals and 4 in intervals and 7 in intervals:
@@ -130,7 +140,10 @@ def identify_progression(roman_numerals: list) -> str:
     # Normalize and convert to tuple for lookup
     normalized = tuple(r.replace('7', '').replace('maj', '') for r in roman_numerals[:5])
 
-    for pattern, name in COMMON_PROGRESSIONS.items():
+    if not normalized:
+        return None
+
+    for pattern, name in _PROGRESSIONS_BY_FIRST.get(normalized[0], ()):
         if normalized[:len(pattern)] == pattern:
             return name
 
@@ -139,14 +152,73 @@ def identify_progression(roman_numerals: list) -> str:
 
 def get_key_signature_notes(key_tonic: str, mode: str = 'major') -> list:
     """Get the notes in a key signature."""
-    tonic = normalize_note(key_tonic)
-    if tonic not in CHROMATIC_NOTES:
-        tonic = 'C'
+    tonic_idx = CHROMATIC_INDEX.get(key_tonic, 0)
+    return list(_KEY_SIGNATURE_NOTES[tonic_idx, mode == 'major'])
+
+
+# Scale notes for each (tonic pitch class, is major) pair
+_KEY_SIGNATURE_NOTES = {
+    (tonic_idx, is_major): tuple(
+        CHROMATIC_NOTES[(tonic_idx + d) % 12]
+        for d in (MAJOR_SCALE_DEGREES if is_major else MINOR_SCALE_DEGREES)
+    )
+    for tonic_idx in range(12)
+    for is_major in (True, False)
+}
 
-    tonic_idx = CHROMATIC_NOTES.index(tonic)
-    degrees = MAJOR_SCALE_DEGREES if mode == 'major' else MINOR_SCALE_DEGREES
 
-    return [CHROMATIC_NOTES[(tonic_idx + d) % 12] for d in degrees]
+# Harmonic function analysis for each scale degree, used by analyze_chord_function
+_CHORD_FUNCTION_ANALYSIS = {
+    'I': {
+        'function': 'tonic',
+        'tendency': 'stable',
+        'common_next': ['IV', 'V', 'vi', 'ii'],
+        'description': 'Home chord. Creates stability and resolution.',
+    },
+    'II': {
+        'function': 'predominant',
+        'tendency': 'moves to V',
+        'common_next': ['V', 'vii°'],
+        'description': 'Supertonic. Creates motion toward dominant.',
+    },
+    'III': {
+        'function': 'tonic',
+        'tendency': 'stable (substitute)',
+        'common_next': ['IV', 'vi'],
+        'description': 'Mediant. Can substitute for tonic.',
+    },
+    'IV': {
+        'function': 'predominant',
+        'tendency': 'moves to V or I',
+        'common_next': ['V', 'I', 'ii'],
+        'description': 'Subdominant. Strong predominant function.',
+    },
+    'V': {
+        'function': 'dominant',
+        'tendency': 'resolves to I',
+        'common_next': ['I', 'vi'],
+        'description': 'Dominant. Creates tension wanting resolution.',
+    },
+    'VI': {
+        'function': 'tonic',
+        'tendency': 'stable (substitute)',
+        'common_next': ['IV', 'ii', 'V'],
+        'description': 'Submediant. Deceptive resolution target.',
+    },
+    'VII': {
+        'function': 'dominant',
+        'tendency': 'resolves to I',
+        'common_next': ['I', 'iii'],
+        'description': 'Leading tone chord. Strong pull to tonic.',
+    },
+}
+
+_UNKNOWN_CHORD_FUNCTION = {
+    'function': 'unknown',
+    'tendency': 'context-dependent',
+    'common_next': [],
+    'description': 'Chord function could not be determined.',
+}
 
 
 def analyze_chord_function(roman: str, key_mode: str = 'major') -> dict:
@@ -157,57 +229,7 @@ def analyze_chord_function(roman: str, key_mode: str = 'major') -> dict:
     """
     base = roman.upper().replace('7', '').replace('MAJ', '').replace('DIM', '').replace('AUG', '')
 
-    functions = {
-        'I': {
-            'function': 'tonic',
-            'tendency': 'stable',
-            'common_next': ['IV', 'V', 'vi', 'ii'],
-            'description': 'Home chord. Creates stability and resolution.',
-        },
-        'II': {
-            'function': 'predominant',
-            'tendency': 'moves to V',
-            'common_next': ['V', 'vii°'],
-            'description': 'Supertonic. Creates motion toward dominant.',
-        },
-        'III': {
-            'function': 'tonic',
-            'tendency': 'stable (substitute)',
-            'common_next': ['IV', 'vi'],
-            'description': 'Mediant. Can substitute for tonic.',
-        },
-        'IV': {
-            'function': 'predominant',
-            'tendency': 'moves to V or I',
-            'common_next': ['V', 'I', 'ii'],
-            'description': 'Subdominant. Strong predominant function.',
-        },
-        'V': {
-            'function': 'dominant',
-            'tendency': 'resolves to I',
-            'common_next': ['I', 'vi'],
-            'description': 'Dominant. Creates tension wanting resolution.',
-        },
-        'VI': {
-            'function': 'tonic',
-            'tendency': 'stable (substitute)',
-            'common_next': ['IV', 'ii', 'V'],
-            'description': 'Submediant. Deceptive resolution target.',
-        },
-        'VII': {
-            'function': 'dominant',
-            'tendency': 'resolves to I',
-            'common_next': ['I', 'iii'],
-            'description': 'Leading tone chord. Strong pull to tonic.',
-        },
-    }
-
-    if base in functions:
-        return functions[base]
-
-    return {
-        'function': 'unknown',
-        'tendency': 'context-dependent',
-        'common_next': [],
-        'description': 'Chord function could not be determined.',
-    }
+    entry = _CHORD_FUNCTION_ANALYSIS.get(base, _UNKNOWN_CHORD_FUNCTION)
+
+    # Hand out a fresh dict each call, since callers may modify it
+    return {**entry, 'common_next': list(entry['common_next'])}
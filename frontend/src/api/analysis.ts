@@ -37,15 +37,25 @@ export function connectAnalysisSocket(
 ): WebSocket {
   const ws = new WebSocket(`ws://localhost:8000/ws/analysis/${id}`);
 
+  let lastSeq = -1;
+
+  // Frames are compact [tag, seq, payload] arrays; see WS_* tags in the backend
   ws.onmessage = (event) => {
-    const data = JSON.parse(event.data);
-
-    if (data.type === 'progress') {
-      onProgress(data.progress);
-    } else if (data.type === 'complete') {
-      onComplete(data.result);
-    } else if (data.type === 'error') {
-      onError(data.message);
+    const [tag, seq, payload] = JSON.parse(event.data);
+
+    // A jump in sequence numbers means frames were lost
+    if (seq !== lastSeq + 1) {
+      console.warn(`Analysis socket skipped from seq ${lastSeq} to ${seq}`);
+    }
+    lastSeq = seq;
+
+    if (tag === 0) {
+      // Progress updates arrive coalesced into batches
+      payload.forEach((progress: number) => onProgress(progress));
+    } else if (tag === 1) {
+      onComplete(payload);
+    } else if (tag === 2) {
+      onError(payload);
     }
   };
 